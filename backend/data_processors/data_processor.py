@@ -1,6 +1,169 @@
+import importlib.util
+import itertools
+import re
+from datetime import datetime
+from typing import Any, NamedTuple
+import numpy as np
+import openpyxl
 import pandas as pd
 import io
 
+# numba is optional, validation falls back to NumPy masks without it
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# python-calamine is optional, pandas 2.2+ can use it to read whole Excel
+# files much faster than openpyxl or xlrd
+_USE_CALAMINE = (
+    importlib.util.find_spec("python_calamine") is not None
+    and tuple(int(part) for part in pd.__version__.split('.')[:2]) >= (2, 2)
+)
+
+# Map various condition descriptions to standard values
+CONDITION_MAPPING = {
+    'excellent': 'Excellent',
+    'exc': 'Excellent',
+    'good': 'Good',
+    'fair': 'Fair',
+    'poor': 'Poor',
+    'broken': 'Poor',
+    'damaged': 'Poor',
+    'new': 'Excellent',
+    'like new': 'Excellent',
+    'used': 'Good',
+    'working': 'Good',
+    'non-working': 'Poor',
+    'non working': 'Poor',
+    'unknown': 'Unknown'
+}
+
+# Longest keys first so e.g. "non-working" wins over "working"
+_CONDITION_RE = re.compile(
+    r'\b(' + '|'.join(map(re.escape, sorted(CONDITION_MAPPING, key=len, reverse=True))) + r')\b'
+)
+
+# Columns describing an equipment item, in EquipmentItem field order
+EQUIPMENT_FIELDS = ['Unit #', 'Description', 'Year', 'Location', 'Condition']
+
+class EquipmentItem(NamedTuple):
+    """Details of one equipment item, with None for missing values"""
+    unit: Any
+    description: Any
+    year: Any = None
+    location: Any = None
+    condition: Any = None
+    
+    @classmethod
+    def from_row(cls, row):
+        """Build an item from a DataFrame row or a mapping keyed by column name"""
+        values = (row.get(field) for field in EQUIPMENT_FIELDS)
+        return cls._make(None if value is None or pd.isna(value) else value for value in values)
+
+def iter_equipment_items(df):
+    """
+    Yield each row of an equipment DataFrame as an EquipmentItem
+    
+    Columns are extracted once up front, which avoids building a pandas
+    Series per row the way iterrows does.
+    
+    Args:
+        df: pandas DataFrame with equipment data
+        
+    Yields:
+        EquipmentItem for each row
+    """
+    columns = []
+    for field in EQUIPMENT_FIELDS:
+        if field in df.columns:
+            column = df[field]
+            columns.append(column.astype(object).where(column.notna(), None).to_numpy())
+        else:
+            columns.append(itertools.repeat(None, len(df)))
+    for values in zip(*columns):
+        yield EquipmentItem._make(values)
+
+def _dedup_columns(names):
+    """Rename duplicate column names the way pandas readers do (x, x.1, x.2)"""
+    taken = set(names)
+    used = set()
+    next_suffix = {}
+    columns = []
+    for name in names:
+        if name in used:
+            # Skip suffixes that are already column names in the header
+            suffix = next_suffix.get(name, 1)
+            while f"{name}.{suffix}" in taken or f"{name}.{suffix}" in used:
+                suffix += 1
+            next_suffix[name] = suffix + 1
+            name = f"{name}.{suffix}"
+        used.add(name)
+        columns.append(name)
+    return columns
+
+def _drop_trailing_blank_rows(rows):
+    """Yield rows, dropping the all-blank rows at the end of a sheet"""
+    # Count blank rows instead of buffering them, a sheet can have many
+    # formatted but empty rows after its data
+    blank_run = 0
+    for row in rows:
+        if all(value is None for value in row):
+            blank_run += 1
+            continue
+        # Blank rows followed by data are kept, as pandas keeps them
+        yield from itertools.repeat((None,) * len(row), blank_run)
+        blank_run = 0
+        yield row
+
+def _iter_xlsx_chunks(file_object, chunksize=None):
+    """
+    Read the first sheet of an .xlsx workbook without building its full DOM
+    
+    Args:
+        file_object: File path or file-like object
+        chunksize: Maximum rows per DataFrame (None for a single DataFrame)
+        
+    Yields:
+        pandas DataFrames with consecutive rows of the sheet
+    """
+    workbook = openpyxl.load_workbook(file_object, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            yield pd.DataFrame()
+            return
+        columns = _dedup_columns([name if name is not None else f"Unnamed: {i}" for i, name in enumerate(header)])
+        
+        # Read-only sheets report formatted but empty rows past the data,
+        # which pandas trims. Blank rows between data rows are kept as NaN
+        # rows, the same as pandas.
+        rows = _drop_trailing_blank_rows(rows)
+        if chunksize is None:
+            yield pd.DataFrame.from_records(list(rows), columns=columns)
+            return
+        start = 0
+        while True:
+            records = list(itertools.islice(rows, chunksize))
+            if not records:
+                break
+            yield pd.DataFrame.from_records(records, columns=columns, index=range(start, start + len(records)))
+            start += len(records)
+    finally:
+        workbook.close()
+
+def _read_xlsx(file_object):
+    """Read the first sheet of an .xlsx workbook into one DataFrame"""
+    if _USE_CALAMINE:
+        return pd.read_excel(file_object, engine='calamine')
+    df = next(_iter_xlsx_chunks(file_object))
+    return df.reset_index(drop=True)
+
+def _read_excel(file_object):
+    """Read the first sheet of any Excel workbook into one DataFrame"""
+    return pd.read_excel(file_object, engine='calamine' if _USE_CALAMINE else None)
+
 def load_data(file_object):
     """
     Load data from CSV or Excel file
@@ -15,25 +178,110 @@ def load_data(file_object):
         # It's a file path
         if file_object.endswith('.csv'):
             return pd.read_csv(file_object)
-        elif file_object.endswith(('.xlsx', '.xls')):
-            return pd.read_excel(file_object)
+        elif file_object.endswith('.xlsx'):
+            return _read_xlsx(file_object)
+        elif file_object.endswith('.xls'):
+            return _read_excel(file_object)
     else:
         # It's a file-like object from streamlit
         if hasattr(file_object, 'name'):
             if file_object.name.endswith('.csv'):
                 return pd.read_csv(file_object)
-            elif file_object.name.endswith(('.xlsx', '.xls')):
-                return pd.read_excel(file_object)
+            elif file_object.name.endswith('.xlsx'):
+                return _read_xlsx(file_object)
+            elif file_object.name.endswith('.xls'):
+                return _read_excel(file_object)
         
     # Try to infer the file type
     try:
         return pd.read_csv(file_object)
     except:
         try:
-            return pd.read_excel(file_object)
+            return _read_excel(file_object)
         except Exception as e:
             raise ValueError(f"Unsupported file format: {str(e)}")
 
+def load_data_chunks(file_path, chunksize=10_000):
+    """
+    Load data from a CSV or Excel file in fixed-size chunks
+    
+    Args:
+        file_path: Path to the file
+        chunksize: Maximum number of rows per chunk
+        
+    Yields:
+        pandas DataFrames with at most chunksize rows each
+    """
+    if file_path.endswith('.csv'):
+        yield from pd.read_csv(file_path, chunksize=chunksize)
+    elif file_path.endswith('.xlsx'):
+        yield from _iter_xlsx_chunks(file_path, chunksize)
+    else:
+        # No streaming reader for this format, split the loaded frame instead
+        df = load_data(file_path)
+        for start in range(0, len(df), chunksize):
+            yield df.iloc[start:start + chunksize]
+
+def _year_values(values):
+    """Convert year values to whole-number floats, unparseable values become NaN"""
+    year = pd.to_numeric(values, errors='coerce').astype('float64')
+    # Drop fractions the way an int cast would, without a 0 sentinel for NaN.
+    # Infinite years are kept so validation can flag them as questionable.
+    return np.trunc(year)
+
+def _year_to_int(year):
+    """Cast whole-number float years to nullable integers"""
+    # Infinite values and values too large for int64 cannot be cast, so
+    # they become NA
+    return year.where(year.abs() < 1e15).astype('Int64')
+
+def _coerce_year(values):
+    """Convert year values to nullable integers, unparseable values become NA"""
+    return _year_to_int(_year_values(values))
+
+# Validation issues, in the order they are reported for a row. The
+# questionable year label is formatted with the year itself.
+_ISSUE_LABELS = (
+    "Missing Description",
+    "Missing Year",
+    "Missing Condition",
+    "Questionable year",
+    "Description too short",
+)
+_QUESTIONABLE_YEAR = 3
+
+def _scan_issues_numpy(year, has_year, desc_na, desc_len, cond_na, current_year, flags):
+    """Flag validation issues per row, see _ISSUE_LABELS for the columns"""
+    year_na = np.isnan(year)
+    flags[:, 0] = desc_na
+    if has_year:
+        flags[:, 1] = year_na
+        flags[:, 3] = ~year_na & ((year < 1900) | (year > current_year + 1))
+    flags[:, 2] = cond_na
+    flags[:, 4] = ~desc_na & (desc_len < 5)
+
+def _scan_issues_loop(year, has_year, desc_na, desc_len, cond_na, current_year, flags):
+    """Flag validation issues per row in a single fused pass, for numba"""
+    for i in range(year.shape[0]):
+        if desc_na[i]:
+            flags[i, 0] = 1
+        elif desc_len[i] < 5:
+            flags[i, 4] = 1
+        if has_year:
+            if year[i] != year[i]:
+                flags[i, 1] = 1
+            elif year[i] < 1900 or year[i] > current_year + 1:
+                flags[i, 3] = 1
+        if cond_na[i]:
+            flags[i, 2] = 1
+
+# The fused loop only pays off when compiled; without numba the NumPy masks
+# are faster
+if njit is not None:
+    _scan_issues = njit(cache=True)(_scan_issues_loop)
+else:
+    _scan_issues = _scan_issues_numpy
+
 def validate_equipment_data(df):
     """
     Validate incoming equipment data
@@ -42,7 +290,8 @@ def validate_equipment_data(df):
         df: pandas DataFrame containing equipment data
         
     Returns:
-        Validated pandas DataFrame with potential issues flagged
+        Validated pandas DataFrame with potential issues flagged, and
+        the total number of issues in attrs['validation_issue_count']
     """
     required_fields = ['Unit #', 'Description']
     recommended_fields = ['Year', 'Location', 'Condition']
@@ -57,48 +306,64 @@ def validate_equipment_data(df):
     if missing_recommended:
         print(f"Warning: Missing recommended fields: {missing_recommended}")
     
-    # Make a copy to avoid SettingWithCopyWarning
-    df = df.copy()
+    # Shallow copy so the columns added below don't modify the caller's
+    # frame, without duplicating its data
+    df = df.copy(deep=False)
     
     # Normalize data
     if 'Year' in df.columns:
-        df['Year'] = pd.to_numeric(df['Year'], errors='coerce')
+        year_values = _year_values(df['Year'])
+        df['Year'] = _year_to_int(year_values)
         
-    # Identify potential data issues
-    df['validation_issues'] = df.apply(identify_data_issues, axis=1)
+    # Identify potential data issues. Years are checked before the integer
+    # cast, so a year too large to store, or infinite, is still flagged as
+    # questionable.
+    n = len(df)
+    if 'Year' in df.columns:
+        year = year_values.to_numpy()
+    else:
+        year = np.full(n, np.nan)
+    desc = df['Description']
+    desc_na = desc.isna().to_numpy()
+    desc_len = desc.fillna('').astype(str).str.len().to_numpy(dtype='int64')
+    if 'Condition' in df.columns:
+        cond_na = df['Condition'].isna().to_numpy()
+    else:
+        cond_na = np.zeros(n, dtype=bool)
+    
+    # Read the clock once per validation call, not once per row
+    current_year = datetime.now().year
+    
+    flags = np.zeros((n, len(_ISSUE_LABELS)), dtype=np.int8)
+    _scan_issues(year, 'Year' in df.columns, desc_na, desc_len, cond_na, current_year, flags)
+    
+    # np.nonzero walks the flags row by row, so each row's issues keep the
+    # order of _ISSUE_LABELS
+    issues = [[] for _ in range(n)]
+    for i, code in zip(*(idx.tolist() for idx in np.nonzero(flags))):
+        if code == _QUESTIONABLE_YEAR:
+            issues[i].append(f"Questionable year: {year[i]:.0f}")
+        else:
+            issues[i].append(_ISSUE_LABELS[code])
+    
+    df['validation_issues'] = issues
+    # Total number of issues, so callers need not rescan the column
+    df.attrs['validation_issue_count'] = int(flags.sum())
     
     return df
 
-def identify_data_issues(row):
+def validate_equipment_chunks(chunks):
     """
-    Identify potential issues with an equipment entry
+    Validate a stream of equipment DataFrames one chunk at a time
     
     Args:
-        row: DataFrame row with equipment data
+        chunks: Iterable of pandas DataFrames, e.g. from load_data_chunks
         
-    Returns:
-        List of issue descriptions, empty if no issues
+    Yields:
+        Validated pandas DataFrames with potential issues flagged
     """
-    issues = []
-    
-    # Check for missing values in important fields
-    for field in ['Description', 'Year', 'Condition']:
-        if field in row and pd.isna(row[field]):
-            issues.append(f"Missing {field}")
-    
-    # Check for potentially invalid years
-    if 'Year' in row and not pd.isna(row['Year']):
-        year = row['Year']
-        current_year = pd.Timestamp.now().year
-        if year < 1900 or year > current_year + 1:
-            issues.append(f"Questionable year: {year}")
-    
-    # Check for minimal description
-    if 'Description' in row and not pd.isna(row['Description']):
-        if len(str(row['Description'])) < 5:
-            issues.append("Description too short")
-    
-    return issues
+    for chunk in chunks:
+        yield validate_equipment_data(chunk)
 
 def clean_data(df):
     """
@@ -121,33 +386,16 @@ def clean_data(df):
     
     # Standardize condition values
     if 'Condition' in df.columns:
-        # Map various condition descriptions to standard values
-        condition_mapping = {
-            'excellent': 'Excellent',
-            'exc': 'Excellent',
-            'good': 'Good',
-            'fair': 'Fair',
-            'poor': 'Poor',
-            'broken': 'Poor',
-            'damaged': 'Poor',
-            'new': 'Excellent',
-            'like new': 'Excellent',
-            'used': 'Good',
-            'working': 'Good',
-            'non-working': 'Poor',
-            'non working': 'Poor',
-            'unknown': 'Unknown'
-        }
-        
-        df['Condition'] = df['Condition'].str.lower().map(
-            lambda x: next((v for k, v in condition_mapping.items() if k in str(x).lower()), x)
-        )
+        token = df['Condition'].astype(str).str.lower().str.extract(_CONDITION_RE, expand=False)
+        mapped = token.map(CONDITION_MAPPING)
+        df['Condition'] = mapped.where(mapped.notna(), df['Condition'])
     
     # Convert year to integer if possible
     if 'Year' in df.columns:
-        df['Year'] = pd.to_numeric(df['Year'], errors='coerce')
-        df['Year'] = df['Year'].fillna(0).astype(int)
-        # Set 0 years back to NaN for display
-        df.loc[df['Year'] == 0, 'Year'] = None
+        # Already coerced if the frame came through validate_equipment_data
+        if df['Year'].dtype != 'Int64':
+            df['Year'] = _coerce_year(df['Year'])
+        # Treat 0 years as missing
+        df['Year'] = df['Year'].mask(df['Year'].eq(0).fillna(False))
     
     return df
\ No newline at end of file
@@ -1,37 +1,45 @@
 import os
+import copy
+import io
 import json
 from datetime import datetime
+from functools import lru_cache
+from fontTools import ttLib
 from fpdf import FPDF
 import tempfile
 
-def generate_pdf_report(equipment_row, valuation_data):
+LOGO_PATH = "frontend/public/logos/logo.png"
+
+# Equipment fields listed in the report, also used as their labels
+DETAIL_FIELDS = ['Unit #', 'Description', 'Year', 'Location', 'Condition']
+
+def _build_report_pdf():
     """
-    Generate a PDF valuation report
+    Create a PDF with everything that is the same in every report laid out
+    
+    The fonts are registered and the first page has the logo, title, section
+    headings and field labels drawn. Only the cells in between depend on the
+    report, and their positions are fixed, so they are recorded for
+    generate_pdf_report to fill in.
     
-    Args:
-        equipment_row: DataFrame row with equipment details
-        valuation_data: Dictionary with valuation results
-        
     Returns:
-        Path to the generated PDF file
+        Tuple of the FPDF object and a dict with the positions to fill in
     """
-    # Create PDF object
     pdf = FPDF()
-    pdf.add_page()
-    
-    # Set up fonts
     pdf.add_font('DejaVu', '', 'frontend/fonts/DejaVuSans.ttf', uni=True)
     pdf.add_font('DejaVuB', '', 'frontend/fonts/DejaVuSans-Bold.ttf', uni=True)
-    pdf.set_font('DejaVu', '', 12)
+    pdf.add_page()
     
     # Add header with logo
-    if os.path.exists("frontend/public/logos/logo.png"):
-        pdf.image("frontend/public/logos/logo.png", 10, 8, 30)
+    if os.path.exists(LOGO_PATH):
+        pdf.image(LOGO_PATH, 10, 8, 30)
     
     pdf.set_font('DejaVuB', '', 18)
     pdf.cell(0, 10, "Equipment Valuation Report", ln=True, align='C')
-    pdf.set_font('DejaVu', '', 12)
-    pdf.cell(0, 10, f"Generated on {datetime.now().strftime('%Y-%m-%d %H:%M')}", ln=True, align='C')
+    
+    # Leave the "Generated on" line empty
+    layout = {'date_y': pdf.get_y()}
+    pdf.ln(10)
     
     # Add equipment details
     pdf.ln(10)
@@ -39,22 +47,86 @@ def generate_pdf_report(equipment_row, valuation_data):
     pdf.cell(0, 10, "Equipment Details", ln=True)
     
     pdf.set_font('DejaVu', '', 12)
-    fields = [
-        ("Unit #", equipment_row.get('Unit #', 'N/A')),
-        ("Description", equipment_row.get('Description', 'N/A')),
-        ("Year", equipment_row.get('Year', 'N/A')),
-        ("Location", equipment_row.get('Location', 'N/A')),
-        ("Condition", equipment_row.get('Condition', 'N/A'))
-    ]
-    
-    for label, value in fields:
+    layout['field_ys'] = []
+    for label in DETAIL_FIELDS:
+        layout['field_ys'].append(pdf.get_y())
         pdf.cell(40, 10, label, 0)
-        pdf.cell(0, 10, str(value), 0, ln=True)
+        pdf.ln(10)
     
     # Add valuation results
     pdf.ln(10)
     pdf.set_font('DejaVuB', '', 14)
     pdf.cell(0, 10, "Valuation Results", ln=True)
+    layout['body_y'] = pdf.get_y()
+    
+    return pdf, layout
+
+@lru_cache(maxsize=1)
+def _template_pdf():
+    """Build the report template once so the fonts, logo and fixed layout are only processed once"""
+    return _build_report_pdf()
+
+@lru_cache(maxsize=None)
+def _font_file_bytes(path):
+    """Read a font file once per process"""
+    with open(path, 'rb') as f:
+        return f.read()
+
+def _copy_font(font, memo):
+    """
+    Copy a parsed TrueType font for one report
+    
+    fpdf's own deepcopy of a font duplicates its glyph width tables, which
+    costs about as much as add_font, yet shares the fontTools font that
+    output() subsets in place. Here the tables, which are only written when
+    the font is added, are shared instead. The report gets its own subset
+    map and its own fontTools font, reopened lazily from the cached file.
+    """
+    new = copy.copy(font)
+    memo[id(font)] = new
+    new.ttfont = ttLib.TTFont(io.BytesIO(_font_file_bytes(font.ttffile)),
+                              recalcTimestamp=False, lazy=True)
+    new.subset = copy.deepcopy(font.subset, memo)
+    new.missing_glyphs = copy.deepcopy(font.missing_glyphs, memo)
+    return new
+
+def _new_report_pdf():
+    """Return a fresh PDF for one report and its layout, copied from the template"""
+    template, layout = _template_pdf()
+    memo = {}
+    for font in template.fonts.values():
+        if getattr(font, 'ttfont', None) is not None:
+            _copy_font(font, memo)
+    try:
+        return copy.deepcopy(template, memo), layout
+    except TypeError:
+        # Some fpdf versions keep font files open, which cannot be copied
+        return _build_report_pdf()
+
+def generate_pdf_report(equipment, valuation_data):
+    """
+    Generate a PDF valuation report
+    
+    Args:
+        equipment: EquipmentItem with equipment details
+        valuation_data: Dictionary with valuation results
+        
+    Returns:
+        Path to the generated PDF file
+    """
+    # Start from the template, then fill in this report's values
+    pdf, layout = _new_report_pdf()
+    
+    pdf.set_font('DejaVu', '', 12)
+    pdf.set_xy(pdf.l_margin, layout['date_y'])
+    pdf.cell(0, 10, f"Generated on {datetime.now().strftime('%Y-%m-%d %H:%M')}", align='C')
+    
+    # DETAIL_FIELDS follows the EquipmentItem field order
+    for value, y in zip(equipment, layout['field_ys']):
+        pdf.set_xy(pdf.l_margin + 40, y)
+        pdf.cell(0, 10, str(value) if value is not None else 'N/A', 0)
+    
+    pdf.set_y(layout['body_y'])
     
     pdf.set_font('DejaVu', '', 12)
     
@@ -145,7 +217,7 @@ def generate_pdf_report(equipment_row, valuation_data):
     
     # Save PDF to temp file
     temp_dir = tempfile.mkdtemp()
-    unit_id = str(equipment_row.get('Unit #', 'equipment')).replace('/', '-')
+    unit_id = str(equipment.unit if equipment.unit is not None else 'equipment').replace('/', '-')
     pdf_path = os.path.join(temp_dir, f"{unit_id}_valuation.pdf")
     pdf.output(pdf_path)
     
@@ -1,138 +1,317 @@
 import os
-import json
 import anthropic
-import hashlib
+import atexit
+import importlib.util
+import orjson
+import xxhash
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
-from functools import lru_cache
+from pathlib import Path
 from tqdm import tqdm
+from backend.data_processors.data_processor import iter_equipment_items
 import re
+import sqlite3
+import threading
 import time
+from collections import deque
 
 # Load environment variables
 load_dotenv()
 
+# Concurrency and rate limits for API calls
+MAX_CONCURRENCY = int(os.getenv("ANTHROPIC_MAX_CONCURRENCY", "16"))
+REQUESTS_PER_MINUTE = int(os.getenv("ANTHROPIC_REQUESTS_PER_MINUTE", "50"))
+# Message Batches submitted but not yet collected when processing in chunks
+MAX_BATCHES_IN_FLIGHT = max(1, int(os.getenv("ANTHROPIC_MAX_BATCHES_IN_FLIGHT", "2")))
+
+# One pooled HTTP client shared by all threads, so concurrent requests reuse
+# open TLS connections. DefaultHttpxClient keeps the SDK's own defaults and
+# transport; Limits is taken from the SDK so the httpx flavour it was built
+# on need not be imported here. HTTP/2 needs the optional h2 package.
+_pool_size = max(32, MAX_CONCURRENCY)
+http_client = anthropic.DefaultHttpxClient(
+    http2=importlib.util.find_spec("h2") is not None,
+    limits=type(anthropic.DEFAULT_CONNECTION_LIMITS)(
+        max_connections=_pool_size, max_keepalive_connections=_pool_size
+    ),
+    timeout=anthropic.Timeout(600.0, connect=5.0)
+)
+atexit.register(http_client.close)
+
 # Initialize Anthropic client with API key
-client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"), http_client=http_client)
 
-def get_equipment_hash(row):
-    """Create a unique hash for an equipment item"""
-    item_str = f"{row['Unit #']}|{row['Description']}"
+class RateLimiter:
+    """Thread-safe limiter that spaces out calls to stay under a per-minute quota"""
+    
+    def __init__(self, requests_per_minute):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+    
+    def acquire(self):
+        """Block until the caller may issue the next request"""
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+rate_limiter = RateLimiter(REQUESTS_PER_MINUTE)
+
+# Valuation cache, one SQLite connection per thread. The directory is
+# created once here rather than on every lookup.
+CACHE_DB_PATH = Path(os.getenv("VALUATION_CACHE_DB", "./cache/valuations.db"))
+CACHE_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+_cache_local = threading.local()
+
+# Fenced ```json block in a model response
+_JSON_BLOCK_RE = re.compile(r'```json\s*\n(.*?)\n\s*```', re.DOTALL)
+
+# Static instructions are sent as the system prompt so they form a prefix
+# that prompt caching can reuse across items; only the equipment details
+# vary per request
+VALUATION_SYSTEM_PROMPT = """You are a heavy equipment valuation expert with access to web search. Provide structured JSON responses.
+
+Provide your valuation analysis in JSON format with the following structure:
+
+```json
+{
+  "new_value": 50000,
+  "current_value_range": [15000, 20000],
+  "confidence": "medium",
+  "comparable_sales": [
+    {
+      "title": "2015 CAT D6 Dozer",
+      "price": 35000,
+      "url": "https://example.com/listing/123",
+      "date": "2025-01-15"
+    }
+  ],
+  "justification": "Detailed reasoning for the valuation...",
+  "key_factors": ["Age impact", "Market trends", "Condition factors"]
+}
+```
+
+Use web search to find comparable sales and current market values. Include specific sources for all information."""
+
+ENHANCEMENT_SYSTEM_PROMPT = """You are a heavy equipment valuation expert with access to web search. Provide enhanced analysis in the same JSON structure as the input, with an additional field for enhanced analysis.
+
+Focus on:
+1. Regional market variations for the equipment's location
+2. Recent auction results
+3. Maintenance history implications
+4. Parts availability impact on value
+5. Economic factors affecting this equipment category
+
+Provide the enhanced analysis in the same JSON format as the initial valuation,
+but add an "enhanced_analysis" field with the additional details."""
+
+def _cached_system_prompt(text):
+    """Wrap a static system prompt in a block marked for prompt caching"""
+    return [{"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}]
+
+def get_equipment_hash(unit, description, year=None, location=None, condition=None):
+    """
+    Create a unique hash for an equipment item (a cache key, not a security digest)
+    
+    The arguments follow EquipmentItem, so get_equipment_hash(*item) works.
+    """
+    item_str = f"{unit}|{description}"
     
     # Add optional fields if they exist
-    if 'Year' in row and not pd.isna(row['Year']):
-        item_str += f"|{row['Year']}"
-    if 'Condition' in row and not pd.isna(row['Condition']):
-        item_str += f"|{row['Condition']}"
+    if year is not None:
+        item_str += f"|{year}"
+    if condition is not None:
+        item_str += f"|{condition}"
+    if location is not None:
+        item_str += f"|location={location}"
         
-    return hashlib.md5(item_str.encode()).hexdigest()
+    return xxhash.xxh3_64(item_str.encode()).hexdigest()
+
+def _get_cache_connection():
+    """Return this thread's connection to the valuation cache database"""
+    conn = getattr(_cache_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(CACHE_DB_PATH, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS valuations (hash TEXT PRIMARY KEY, payload BLOB)")
+        conn.execute("CREATE TABLE IF NOT EXISTS pending_batches (data_key TEXT PRIMARY KEY, batch_id TEXT)")
+        _cache_local.conn = conn
+    return conn
 
-@lru_cache(maxsize=1000)
 def get_cached_valuation(equipment_hash):
     """Retrieve cached valuation if available"""
-    cache_dir = "./cache"
-    os.makedirs(cache_dir, exist_ok=True)
-    
-    cache_path = f"{cache_dir}/{equipment_hash}.json"
-    if os.path.exists(cache_path):
-        try:
-            with open(cache_path, 'r') as f:
-                return json.load(f)
-        except:
-            return None
-    return None
+    row = _get_cache_connection().execute(
+        "SELECT payload FROM valuations WHERE hash = ?", (equipment_hash,)
+    ).fetchone()
+    if row is None:
+        return None
+    try:
+        return orjson.loads(row[0])
+    except orjson.JSONDecodeError:
+        return None
+
+def get_cached_item_valuation(unit, description, year=None, location=None, condition=None):
+    """Retrieve the cached valuation for an equipment item's details, if any"""
+    return get_cached_valuation(get_equipment_hash(unit, description, year, location, condition))
 
 def save_to_cache(equipment_hash, result):
     """Save valuation result to cache"""
-    cache_dir = "./cache"
-    os.makedirs(cache_dir, exist_ok=True)
+    conn = _get_cache_connection()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO valuations (hash, payload) VALUES (?, ?)",
+            (equipment_hash, orjson.dumps(result))
+        )
+
+def get_pending_batch(data_key):
+    """Return the ID of the batch submitted for a loaded equipment list, if any"""
+    row = _get_cache_connection().execute(
+        "SELECT batch_id FROM pending_batches WHERE data_key = ?", (data_key,)
+    ).fetchone()
+    return row[0] if row is not None else None
+
+def save_pending_batch(data_key, batch_id):
+    """Record a submitted batch so it can be collected after a restart"""
+    conn = _get_cache_connection()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO pending_batches (data_key, batch_id) VALUES (?, ?)",
+            (data_key, batch_id)
+        )
+
+def clear_pending_batch(data_key):
+    """Forget the batch submitted for a loaded equipment list"""
+    conn = _get_cache_connection()
+    with conn:
+        conn.execute("DELETE FROM pending_batches WHERE data_key = ?", (data_key,))
+
+def _response_text(response_content):
+    """Flatten Messages API content blocks into plain text"""
+    if isinstance(response_content, str):
+        return response_content
+    return ''.join(block.text for block in response_content if getattr(block, 'type', None) == 'text')
+
+def _find_json_object(text):
+    """Return the first balanced {...} span in text, or None if there is none"""
+    start = text.find('{')
+    if start == -1:
+        return None
     
-    cache_path = f"{cache_dir}/{equipment_hash}.json"
-    with open(cache_path, 'w') as f:
-        json.dump(result, f)
+    # Track brace depth in one pass, ignoring braces inside JSON strings
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == '{':
+            depth += 1
+        elif ch == '}':
+            depth -= 1
+            if depth == 0:
+                return text[start:i+1]
+    return None
 
 def parse_claude_response(response_content):
     """Parse JSON from Claude's response"""
+    text = _response_text(response_content)
+    
     # First try to extract JSON block if it exists
-    json_match = re.search(r'```json\n(.*?)\n```', response_content, re.DOTALL)
+    json_match = _JSON_BLOCK_RE.search(text)
     
     if json_match:
         json_str = json_match.group(1)
         try:
-            return json.loads(json_str)
-        except json.JSONDecodeError:
+            return orjson.loads(json_str)
+        except orjson.JSONDecodeError:
             pass
     
     # If that fails, try to find any JSON-like structure
-    try:
-        # Find the first { and last } in the response
-        start = response_content.find('{')
-        end = response_content.rfind('}')
-        
-        if start != -1 and end != -1 and end > start:
-            json_str = response_content[start:end+1]
-            return json.loads(json_str)
-    except:
-        pass
+    json_str = _find_json_object(text)
+    if json_str is not None:
+        try:
+            return orjson.loads(json_str)
+        except orjson.JSONDecodeError:
+            pass
     
     # Return raw response as fallback
-    return {"raw_response": response_content}
+    return {"raw_response": text}
 
-def process_equipment_item(row):
+def build_valuation_request(unit, description, year=None, location=None, condition=None):
     """
-    Process a single equipment item with Claude
+    Build the Messages API parameters for valuing a single equipment item
     
     Args:
-        row: DataFrame row with equipment details
+        unit: Unit ID of the equipment
+        description: Equipment description
+        year, location, condition: Optional details, None if unknown
         
     Returns:
-        Dictionary with valuation results
+        Dictionary of keyword arguments for client.messages.create
     """
-    # Create hash for caching
-    item_hash = get_equipment_hash(row)
-    
-    # Check cache first
-    cached_result = get_cached_valuation(item_hash)
-    if cached_result:
-        return cached_result
-    
     # Prepare prompt with available fields
     prompt = f"""
     I need a detailed valuation for this equipment:
-    - Unit #: {row['Unit #']}
-    - Description: {row['Description']}
+    - Unit #: {unit}
+    - Description: {description}
     """
     
     # Add optional fields
-    if 'Year' in row and not pd.isna(row['Year']):
-        prompt += f"- Year: {row['Year']}\n"
-    if 'Location' in row and not pd.isna(row['Location']):
-        prompt += f"- Location: {row['Location']}\n"
-    if 'Condition' in row and not pd.isna(row['Condition']):
-        prompt += f"- Condition: {row['Condition']}\n"
-    
-    prompt += """
-    Please provide your valuation analysis in JSON format with the following structure:
+    if year is not None:
+        prompt += f"- Year: {year}\n"
+    if location is not None:
+        prompt += f"- Location: {location}\n"
+    if condition is not None:
+        prompt += f"- Condition: {condition}\n"
     
-    ```json
-    {
-      "new_value": 50000,
-      "current_value_range": [15000, 20000],
-      "confidence": "medium",
-      "comparable_sales": [
-        {
-          "title": "2015 CAT D6 Dozer",
-          "price": 35000,
-          "url": "https://example.com/listing/123",
-          "date": "2025-01-15"
-        }
-      ],
-      "justification": "Detailed reasoning for the valuation...",
-      "key_factors": ["Age impact", "Market trends", "Condition factors"]
+    return {
+        "model": "claude-3-opus-20240229",
+        "max_tokens": 4000,
+        "temperature": 0,
+        "system": _cached_system_prompt(VALUATION_SYSTEM_PROMPT),
+        "messages": [
+            {"role": "user", "content": prompt}
+        ]
     }
-    ```
+
+def process_equipment_item(unit, description, year=None, location=None, condition=None, refresh=False):
+    """
+    Process a single equipment item with Claude
+    
+    The details are plain positional arguments, so an EquipmentItem can be
+    passed as process_equipment_item(*item).
     
-    Use web search to find comparable sales and current market values. Include specific sources for all information.
+    Args:
+        unit: Unit ID of the equipment
+        description: Equipment description
+        year, location, condition: Optional details, None if unknown
+        refresh: Call the API even if a cached valuation exists
+        
+    Returns:
+        Dictionary with valuation results
     """
+    # Create hash for caching
+    item_hash = get_equipment_hash(unit, description, year, location, condition)
+    
+    # Check cache first
+    if not refresh:
+        cached_result = get_cached_valuation(item_hash)
+        if cached_result:
+            return cached_result
+    
+    request = build_valuation_request(unit, description, year, location, condition)
     
     # Make API call with retry logic
     max_retries = 3
@@ -140,15 +319,8 @@ def process_equipment_item(row):
     
     for attempt in range(max_retries):
         try:
-            message = client.messages.create(
-                model="claude-3-opus-20240229",
-                max_tokens=4000,
-                temperature=0,
-                system="You are a heavy equipment valuation expert with access to web search. Provide structured JSON responses.",
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
-            )
+            rate_limiter.acquire()
+            message = client.messages.create(**request)
             
             # Parse the response
             result = parse_claude_response(message.content)
@@ -164,72 +336,260 @@ def process_equipment_item(row):
                 time.sleep(retry_delay)
                 retry_delay *= 2  # Exponential backoff
             else:
-                print(f"All attempts failed for {row['Unit #']}: {str(e)}")
+                print(f"All attempts failed for {unit}: {str(e)}")
                 return {"error": str(e)}
 
-def process_equipment_list(df, max_items=None):
+def process_equipment_list(df, max_items=None, max_workers=MAX_CONCURRENCY):
     """
-    Process multiple equipment items with progress tracking
+    Process multiple equipment items concurrently with progress tracking
     
     Args:
         df: DataFrame with equipment list
         max_items: Maximum number of items to process (None for all)
+        max_workers: Maximum number of API calls in flight at once
         
     Returns:
         Dictionary mapping unit IDs to valuation results
     """
-    results = {}
-    
     # Limit the number of items if specified
     process_df = df.head(max_items) if max_items else df
     
-    for idx, row in tqdm(process_df.iterrows(), total=len(process_df), desc="Processing equipment"):
-        unit_id = row['Unit #']
-        result = process_equipment_item(row)
-        results[unit_id] = result
+    # API calls are rate limited inside process_equipment_item, so cached
+    # items return immediately without waiting for a slot
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(process_equipment_item, *item): item.unit
+            for item in iter_equipment_items(process_df)
+        }
+        for _ in tqdm(as_completed(futures), total=len(futures), desc="Processing equipment"):
+            pass
+    
+    # Collect in input order rather than completion order
+    return {unit_id: future.result() for future, unit_id in futures.items()}
+
+def submit_valuation_batch(items, refresh=False, skip=()):
+    """
+    Submit all uncached equipment items as a single Message Batch
+    
+    Args:
+        items: Iterable of EquipmentItem
+        refresh: Submit every item, including those with a cached valuation
+        skip: Equipment hashes not to submit, e.g. those already in another
+            batch that has not finished yet
         
-        # Small delay to avoid API rate limits
-        time.sleep(0.5)
+    Returns:
+        The created batch, or None if every item is already cached or skipped
+    """
+    requests = {}
+    for item in items:
+        item_hash = get_equipment_hash(*item)
+        if item_hash in requests or item_hash in skip or (not refresh and get_cached_valuation(item_hash)):
+            continue
+        # The equipment hash doubles as the batch custom_id
+        requests[item_hash] = {"custom_id": item_hash, "params": build_valuation_request(*item)}
+    
+    if not requests:
+        return None
+    
+    return client.messages.batches.create(requests=list(requests.values()))
+
+def wait_for_batch(batch_id, poll_interval=30, max_poll_interval=300, on_update=None):
+    """
+    Poll a Message Batch until it has finished processing
+    
+    Args:
+        batch_id: ID of the batch to wait for
+        poll_interval: Seconds to wait after the first status check
+        max_poll_interval: Upper bound for the wait, which doubles after each check
+        on_update: Optional callable given the batch after every status check
+        
+    Returns:
+        The batch once its processing has ended
+    """
+    while True:
+        batch = client.messages.batches.retrieve(batch_id)
+        if on_update is not None:
+            on_update(batch)
+        if batch.processing_status == "ended":
+            return batch
+        time.sleep(poll_interval)
+        poll_interval = min(poll_interval * 2, max_poll_interval)
+
+def cancel_batch(batch_id):
+    """Ask the API to stop processing a Message Batch"""
+    return client.messages.batches.cancel(batch_id)
+
+def collect_batch_results(batch_id):
+    """
+    Parse and cache the results of a finished Message Batch
+    
+    Args:
+        batch_id: ID of a batch whose processing has ended
+        
+    Returns:
+        Dictionary mapping equipment hashes to valuation results
+    """
+    results = {}
+    for entry in client.messages.batches.results(batch_id):
+        if entry.result.type == "succeeded":
+            result = parse_claude_response(entry.result.message.content)
+            save_to_cache(entry.custom_id, result)
+        elif entry.result.type == "errored":
+            result = {"error": str(entry.result.error)}
+        else:
+            # Canceled or expired before it was processed
+            result = {"error": f"Batch request {entry.result.type}"}
+        results[entry.custom_id] = result
+    return results
+
+def process_equipment_batch(df, max_items=None, poll_interval=30, batch_id=None, on_submit=None, on_update=None,
+                            refresh=False):
+    """
+    Process multiple equipment items through the Message Batches API
+    
+    Args:
+        df: DataFrame with equipment list
+        max_items: Maximum number of items to process (None for all)
+        poll_interval: Seconds to wait between batch status checks
+        batch_id: ID of an already submitted batch for these items, to
+            resume waiting on it instead of submitting a new one
+        on_submit: Optional callable given the batch once it is created
+        on_update: Optional callable given the batch after every status check
+        refresh: Submit every item, including those with a cached valuation
         
+    Returns:
+        Dictionary mapping unit IDs to valuation results
+    """
+    # Limit the number of items if specified
+    process_df = df.head(max_items) if max_items else df
+    items = list(iter_equipment_items(process_df))
+    
+    if batch_id is None:
+        batch = submit_valuation_batch(items, refresh)
+        if batch is not None:
+            batch_id = batch.id
+            print(f"Submitted batch {batch_id}, waiting for results...")
+            if on_submit is not None:
+                on_submit(batch)
+    
+    return _results_by_unit(items, _wait_for_batch_results(batch_id, poll_interval, on_update))
+
+def _wait_for_batch_results(batch_id, poll_interval=30, on_update=None):
+    """Wait for a batch and return its results by equipment hash ({} for no batch)"""
+    if batch_id is None:
+        return {}
+    wait_for_batch(batch_id, poll_interval, on_update=on_update)
+    return collect_batch_results(batch_id)
+
+def _results_by_unit(items, batch_results):
+    """
+    Map batch results back to the items' unit IDs
+    
+    Items left out of the batch, e.g. because they were cached, are read
+    from the cache.
+    """
+    results = {}
+    for item in items:
+        item_hash = get_equipment_hash(*item)
+        results[item.unit] = batch_results.get(item_hash) or get_cached_valuation(item_hash)
+    
     return results
 
-def enhance_valuation(equipment_id, initial_valuation, row):
+def _limit_chunks(chunks, max_items=None):
+    """Yield chunks until max_items rows in total have been yielded (None for all)"""
+    if not max_items:
+        yield from chunks
+        return
+    
+    remaining = max_items
+    for chunk in chunks:
+        chunk = chunk.head(remaining)
+        remaining -= len(chunk)
+        yield chunk
+        # Stop before the next chunk is read, not after
+        if remaining <= 0:
+            break
+
+def process_equipment_chunks(chunks, max_items=None, use_batch=True, poll_interval=30):
+    """
+    Process a stream of equipment DataFrames, yielding results chunk by chunk
+    
+    Args:
+        chunks: Iterable of validated equipment DataFrames
+        max_items: Maximum number of items to process across all chunks (None for all)
+        use_batch: Submit each chunk through the Message Batches API rather
+            than sending one request per item
+        poll_interval: Seconds to wait between batch status checks
+        
+    Yields:
+        Dictionary mapping unit IDs to valuation results for each chunk
+    """
+    chunks = _limit_chunks(chunks, max_items)
+    if not use_batch:
+        for chunk in chunks:
+            yield process_equipment_list(chunk)
+        return
+    
+    # Keep up to MAX_BATCHES_IN_FLIGHT batches submitted ahead, so they are
+    # processed side by side while only that many chunks' items are held in
+    # memory. Items already in a batch still in flight are not submitted
+    # again; their results are carried over once that batch is collected.
+    window = deque()
+    carried = {}
+    
+    def collect_oldest():
+        nonlocal carried
+        items, batch_id, _ = window.popleft()
+        batch_results = {**carried, **_wait_for_batch_results(batch_id, poll_interval)}
+        # Only keep the results later chunks in the window skipped submitting
+        needed = set().union(*(hashes for _, _, hashes in window))
+        carried = {item_hash: result for item_hash, result in batch_results.items() if item_hash in needed}
+        return _results_by_unit(items, batch_results)
+    
+    for chunk in chunks:
+        if len(window) >= MAX_BATCHES_IN_FLIGHT:
+            yield collect_oldest()
+        items = list(iter_equipment_items(chunk))
+        hashes = {get_equipment_hash(*item) for item in items}
+        in_flight = set().union(*(chunk_hashes for _, _, chunk_hashes in window))
+        batch = submit_valuation_batch(items, skip=in_flight)
+        if batch is not None:
+            print(f"Submitted batch {batch.id} with {batch.request_counts.processing} requests")
+        window.append((items, batch.id if batch is not None else None, hashes))
+    
+    while window:
+        yield collect_oldest()
+
+def enhance_valuation(equipment_id, initial_valuation, description, year=None, location=None, condition=None):
     """
     Add more depth to an existing valuation
     
     Args:
         equipment_id: Unit ID of the equipment
         initial_valuation: Initial valuation results
-        row: DataFrame row with equipment details
+        description: Equipment description
+        year, location, condition: Optional details, None if unknown
         
     Returns:
         Enhanced valuation dictionary
     """
     prompt = f"""
     I have an initial valuation for this equipment:
-    {json.dumps(initial_valuation, indent=2)}
+    {orjson.dumps(initial_valuation, option=orjson.OPT_INDENT_2).decode()}
     
     Please provide a more detailed analysis for:
-    - Unit #: {row['Unit #']}
-    - Description: {row['Description']}
-    
-    Focus on:
-    1. Regional market variations for {row.get('Location', 'the region')}
-    2. Recent auction results
-    3. Maintenance history implications
-    4. Parts availability impact on value
-    5. Economic factors affecting this equipment category
-    
-    Provide the enhanced analysis in the same JSON format as the initial valuation, 
-    but add an "enhanced_analysis" field with the additional details.
+    - Unit #: {equipment_id}
+    - Description: {description}
+    - Location: {location if location is not None else 'Unspecified'}
     """
     
     try:
+        rate_limiter.acquire()
         message = client.messages.create(
             model="claude-3-opus-20240229",
             max_tokens=4000,
             temperature=0.1,  # Slightly higher temperature for more detail
-            system="You are a heavy equipment valuation expert with access to web search. Provide enhanced analysis in the same JSON structure as the input, with an additional field for enhanced analysis.",
+            system=_cached_system_prompt(ENHANCEMENT_SYSTEM_PROMPT),
             messages=[
                 {"role": "user", "content": prompt}
             ]
@@ -245,7 +605,7 @@ def enhance_valuation(equipment_id, initial_valuation, row):
                 enhanced["enhanced_analysis"] = enhanced.get("justification", "")
             
             # Save enhanced valuation to cache with a different key
-            item_hash = get_equipment_hash(row) + "_enhanced"
+            item_hash = get_equipment_hash(equipment_id, description, year, location, condition) + "_enhanced"
             save_to_cache(item_hash, enhanced)
             
             return enhanced
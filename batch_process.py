@@ -2,18 +2,92 @@
 import argparse
 import os
 import pandas as pd
-import json
+import orjson
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from backend.data_processors.data_processor import load_data, validate_equipment_data
-from backend.valuation_engine.claude_valuation import process_equipment_list
+from backend.data_processors.data_processor import load_data_chunks, validate_equipment_chunks
+from backend.valuation_engine.claude_valuation import process_equipment_chunks
+
+# pyarrow is only needed for the Parquet input cache
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
 
 def parse_args():
     parser = argparse.ArgumentParser(description='Batch process equipment valuations')
     parser.add_argument('--input', '-i', required=True, help='Input CSV or Excel file with equipment list')
     parser.add_argument('--output', '-o', required=True, help='Output directory for valuation results')
     parser.add_argument('--limit', '-l', type=int, help='Limit processing to N items', default=None)
+    parser.add_argument('--no-batch', action='store_true',
+                        help='Send one API request per item instead of using the Message Batches API')
+    parser.add_argument('--poll-interval', type=int, default=30,
+                        help='Seconds between Message Batch status checks')
+    parser.add_argument('--chunksize', type=int, default=10_000,
+                        help='Number of rows to load and process at a time')
+    parser.add_argument('--per-unit-files', action='store_true',
+                        help='Also write a separate JSON file for each equipment item')
     return parser.parse_args()
 
+def load_input_chunks(input_path, chunksize):
+    """
+    Load the equipment list in chunks, reusing a Parquet copy from a previous run
+    
+    The Parquet sidecar is written next to the input file as it is read and
+    is only used while it is at least as new as the input. An input that is
+    only partly read (e.g. with --limit) leaves no sidecar behind.
+    """
+    if pq is None:
+        yield from load_data_chunks(input_path, chunksize)
+        return
+    
+    sidecar_path = input_path + '.parquet'
+    if os.path.exists(sidecar_path) and os.path.getmtime(sidecar_path) >= os.path.getmtime(input_path):
+        try:
+            parquet_file = pq.ParquetFile(sidecar_path)
+        except Exception as e:
+            print(f"Warning: Could not read {sidecar_path}, reloading input: {str(e)}")
+        else:
+            for batch in parquet_file.iter_batches(batch_size=chunksize):
+                yield batch.to_pandas()
+            return
+    
+    partial_path = sidecar_path + '.partial'
+    writer = None
+    write_failed = False
+    complete = False
+    try:
+        for chunk in load_data_chunks(input_path, chunksize):
+            if not write_failed:
+                try:
+                    # Store every column as text so all chunks share one schema
+                    table = pa.Table.from_pandas(chunk.astype('string'), preserve_index=False)
+                    if writer is None:
+                        writer = pq.ParquetWriter(partial_path, table.schema)
+                    writer.write_table(table)
+                except Exception as e:
+                    print(f"Warning: Could not write Parquet cache {sidecar_path}: {str(e)}")
+                    write_failed = True
+            yield chunk
+        complete = True
+    finally:
+        if writer is not None:
+            writer.close()
+            if complete and not write_failed:
+                os.replace(partial_path, sidecar_path)
+            else:
+                os.remove(partial_path)
+
+def write_unit_file(output_dir, unit_id, result):
+    """Write one equipment item's valuation to its own JSON file"""
+    # Clean unit_id to be used as a filename
+    safe_id = str(unit_id).replace('/', '-').replace('\\', '-')
+    output_file = os.path.join(output_dir, f"{safe_id}.json")
+    
+    with open(output_file, 'wb') as f:
+        f.write(orjson.dumps(result, option=orjson.OPT_INDENT_2))
+
 def main():
     args = parse_args()
     
@@ -26,32 +100,35 @@ def main():
     os.makedirs(args.output, exist_ok=True)
     
     print(f"Loading data from {args.input}...")
-    df = load_data(args.input)
-    validated_df = validate_equipment_data(df)
+    chunks = validate_equipment_chunks(load_input_chunks(args.input, args.chunksize))
     
     print(f"Processing {args.limit if args.limit else 'all'} equipment items...")
-    results = process_equipment_list(validated_df, max_items=args.limit)
-    
-    print(f"Writing results to {args.output}...")
-    
-    # Save individual JSON files for each equipment item
-    for unit_id, result in results.items():
-        # Clean unit_id to be used as a filename
-        safe_id = str(unit_id).replace('/', '-').replace('\\', '-')
-        output_file = os.path.join(args.output, f"{safe_id}.json")
-        
-        with open(output_file, 'w') as f:
-            json.dump(result, f, indent=2)
     
-    # Save a combined results file
-    combined_file = os.path.join(args.output, "combined_results.json")
-    with open(combined_file, 'w') as f:
-        json.dump(results, f, indent=2)
+    # Results are written out chunk by chunk as each chunk's batch finishes.
+    # Only the chunks whose batches are in flight (MAX_BATCHES_IN_FLIGHT,
+    # 2 by default) are held in memory. All results go to a single JSON
+    # Lines file; per-unit files are opt-in and written concurrently.
+    results_file = os.path.join(args.output, "results.jsonl")
+    processed = 0
+    with open(results_file, 'wb') as out, ThreadPoolExecutor(max_workers=16) as executor:
+        for results in process_equipment_chunks(chunks, max_items=args.limit,
+                                                use_batch=not args.no_batch,
+                                                poll_interval=args.poll_interval):
+            out.writelines(
+                orjson.dumps({"unit_id": str(unit_id), "valuation": result}) + b"\n"
+                for unit_id, result in results.items()
+            )
+            
+            if args.per_unit_files:
+                # list() so any write error is raised here
+                list(executor.map(lambda item: write_unit_file(args.output, *item), results.items()))
+            
+            processed += len(results)
     
-    print(f"Successfully processed {len(results)} equipment items")
+    print(f"Successfully processed {processed} equipment items")
     print(f"Results saved to {args.output}")
     
     return 0
 
 if __name__ == "__main__":
-    exit(main())
\ No newline at end of file
+    exit(main())
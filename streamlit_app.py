@@ -1,15 +1,28 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import os
 import json
-import base64
+import io
+import shutil
+import xxhash
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timezone
 
 # Import valuation engine
-from backend.valuation_engine.claude_valuation import process_equipment_item, process_equipment_list
-from backend.data_processors.data_processor import load_data, validate_equipment_data
-from backend.utils.report_generator import generate_pdf_report
+from backend.valuation_engine.claude_valuation import (
+    process_equipment_batch, get_cached_item_valuation, cancel_batch,
+    get_pending_batch, save_pending_batch, clear_pending_batch
+)
+from backend.data_processors.data_processor import load_data, validate_equipment_data, EquipmentItem
+from backend.utils.report_generator import generate_pdf_report, LOGO_PATH
+
+# Display colour for each valuation confidence level
+CONFIDENCE_COLORS = {
+    'high': 'green',
+    'medium': 'orange',
+    'low': 'red'
+}
 
 # Set page configuration
 st.set_page_config(
@@ -22,15 +35,78 @@ st.set_page_config(
 # Initialize session state
 if 'equipment_data' not in st.session_state:
     st.session_state.equipment_data = None
+    st.session_state.equipment_key = None
 if 'valuation_results' not in st.session_state:
     st.session_state.valuation_results = {}
-if 'selected_equipment' not in st.session_state:
-    st.session_state.selected_equipment = None
+if 'session_started' not in st.session_state:
+    # Fixed per session so the footer is unchanged between reruns
+    st.session_state.session_started = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    
+def prepare_equipment_data(df):
+    """Validate a loaded equipment list and convert it for display and filtering"""
+    df = validate_equipment_data(df)
     
+    # Year is only shown and filtered as text, so cast it once here rather
+    # than on every rerun
+    if 'Year' in df.columns:
+        df['Year'] = df['Year'].astype('string')
+    
+    # Location and Condition have few distinct values and are only filtered
+    # by equality, which is cheaper on integer category codes
+    for column in ('Location', 'Condition'):
+        if column in df.columns:
+            df[column] = df[column].astype('category')
+    
+    return df
+
+def category_mask(column, selected):
+    """Boolean mask of the rows of a categorical column whose value is in selected"""
+    codes = column.cat.categories.get_indexer(list(selected))
+    return np.isin(column.cat.codes.to_numpy(), codes[codes >= 0])
+
+# Uploads are keyed on their bytes and the sample on its path and mtime,
+# so reruns reuse the validated frame instead of parsing the file again
+@st.cache_data(show_spinner=False)
+def load_uploaded_data(file_bytes, name):
+    """Load and validate the contents of an uploaded equipment list"""
+    buffer = io.BytesIO(file_bytes)
+    buffer.name = name
+    return prepare_equipment_data(load_data(buffer))
+
+@st.cache_data(show_spinner=False)
+def load_sample_data(path, mtime):
+    """Load and validate an equipment list from disk, mtime invalidates the cache"""
+    return prepare_equipment_data(load_data(path))
+
+# The frame itself is not hashed (leading underscore); data_key identifies
+# the loaded file so the options are only rebuilt when the data changes
+@st.cache_data(show_spinner=False)
+def filter_options(_df, data_key, column):
+    """Distinct non-missing values of a column for its filter widget"""
+    return _df[column].dropna().unique().tolist()
+
+# Reports are deterministic in the item and its valuation apart from the
+# "Generated on" stamp, so rendered bytes are kept in memory for a day.
+# Disk persistence would ignore the TTL and keep stale dates forever.
+@st.cache_data(ttl=24 * 3600, max_entries=256, show_spinner="Rendering PDF...")
+def render_pdf_bytes(item, valuation):
+    """Render the PDF report for an equipment item and return its bytes"""
+    pdf_path = Path(generate_pdf_report(item, valuation))
+    try:
+        return pdf_path.read_bytes()
+    finally:
+        shutil.rmtree(pdf_path.parent, ignore_errors=True)
+
+# The logo never changes, so read it once per server process
+@st.cache_resource
+def logo_bytes():
+    """Contents of the logo image"""
+    return Path(LOGO_PATH).read_bytes()
+
 # Application header
 col1, col2 = st.columns([1, 5])
 with col1:
-    st.image("frontend/public/logos/logo.png", width=100)
+    st.image(logo_bytes(), width=100)
 with col2:
     st.title("Automated Equipment Valuation System")
     st.caption("Powered by Claude API")
@@ -45,39 +121,83 @@ if upload_option == "Upload File":
     if uploaded_file is not None:
         try:
             # Load and validate data
-            df = load_data(uploaded_file)
-            validated_df = validate_equipment_data(df)
+            file_bytes = uploaded_file.getvalue()
+            validated_df = load_uploaded_data(file_bytes, uploaded_file.name)
             st.session_state.equipment_data = validated_df
+            st.session_state.equipment_key = f"{uploaded_file.name}:{xxhash.xxh3_64(file_bytes).hexdigest()}"
             
-            if 'validation_issues' in validated_df.columns:
-                issues_count = validated_df['validation_issues'].str.len().sum()
-                if issues_count > 0:
-                    st.sidebar.warning(f"Found {issues_count} potential data issues")
+            issues_count = validated_df.attrs.get('validation_issue_count', 0)
+            if issues_count > 0:
+                st.sidebar.warning(f"Found {issues_count} potential data issues")
         except Exception as e:
             st.sidebar.error(f"Error loading file: {str(e)}")
 else:
     if st.sidebar.button("Load Sample Data"):
         sample_path = "data/sample_data/sample_equipment_list.csv"
         if os.path.exists(sample_path):
-            df = load_data(sample_path)
-            validated_df = validate_equipment_data(df)
+            sample_mtime = os.path.getmtime(sample_path)
+            validated_df = load_sample_data(sample_path, sample_mtime)
             st.session_state.equipment_data = validated_df
+            st.session_state.equipment_key = f"{sample_path}:{sample_mtime}"
             st.sidebar.success("Sample data loaded successfully!")
         else:
             st.sidebar.error("Sample data file not found")
 
 # Process button
+def run_valuation_batch(batch_id=None, refresh=False):
+    """Value the loaded equipment through one Message Batch, resuming batch_id if given"""
+    progress = st.sidebar.progress(0.0, text="Checking batch..." if batch_id else "Submitting batch...")
+    
+    # The batch ID is stored in the valuation cache database, keyed by the
+    # loaded file, so it can be resumed or cancelled later, even after a
+    # reload or restart, instead of being submitted again
+    def on_submit(batch):
+        save_pending_batch(st.session_state.equipment_key, batch.id)
+    
+    def on_update(batch):
+        counts = batch.request_counts
+        pending = counts.processing
+        total = pending + counts.succeeded + counts.errored + counts.canceled + counts.expired
+        if total:
+            progress.progress((total - pending) / total,
+                              text=f"{counts.succeeded} succeeded, {counts.errored} errored, {pending} processing")
+    
+    try:
+        results = process_equipment_batch(st.session_state.equipment_data, poll_interval=5,
+                                          batch_id=batch_id, on_submit=on_submit, on_update=on_update,
+                                          refresh=refresh)
+    except Exception as e:
+        progress.empty()
+        st.sidebar.error(f"Error processing valuations: {str(e)}")
+        return
+    
+    st.session_state.valuation_results = results
+    clear_pending_batch(st.session_state.equipment_key)
+    # Rerun so the page shows the new valuations
+    st.rerun()
+
+# Valuation work is only requested here and run after the main content is
+# drawn, so the equipment list stays usable while a batch is processed
+valuation_run = None
 if st.session_state.equipment_data is not None:
-    if st.sidebar.button("Process Valuations"):
-        with st.spinner("Processing equipment valuations..."):
-            results = {}
-            for idx, row in st.session_state.equipment_data.iterrows():
-                unit_id = row['Unit #']
-                st.sidebar.text(f"Processing: {unit_id}")
-                result = process_equipment_item(row)
-                results[unit_id] = result
-            st.session_state.valuation_results = results
-            st.sidebar.success("Valuation complete!")
+    pending_batch_id = get_pending_batch(st.session_state.equipment_key)
+    if pending_batch_id is not None:
+        st.sidebar.info(f"Valuation batch {pending_batch_id} has been submitted for this file")
+        if st.sidebar.button("Check Batch Status"):
+            valuation_run = {'batch_id': pending_batch_id}
+        if st.sidebar.button("Cancel Batch"):
+            try:
+                cancel_batch(pending_batch_id)
+            except Exception as e:
+                st.sidebar.warning(f"Could not cancel batch: {str(e)}")
+            clear_pending_batch(st.session_state.equipment_key)
+            st.rerun()
+    else:
+        # Valuations are cached on disk by equipment details, so unchanged
+        # items are only sent to the API again when a refresh is forced
+        force_refresh = st.sidebar.checkbox("Force refresh", help="Ignore cached valuations for this run")
+        if st.sidebar.button("Process Valuations"):
+            valuation_run = {'refresh': force_refresh}
 
 # Main content area
 if st.session_state.equipment_data is not None:
@@ -85,46 +205,62 @@ if st.session_state.equipment_data is not None:
     st.header("Equipment List")
     
     # Add filters
+    equipment_data = st.session_state.equipment_data
+    selected_years = selected_locations = selected_conditions = []
     col1, col2, col3 = st.columns(3)
     with col1:
-        if 'Year' in st.session_state.equipment_data.columns:
-            years = st.session_state.equipment_data['Year'].astype(str).unique().tolist()
+        if 'Year' in equipment_data.columns:
+            years = filter_options(equipment_data, st.session_state.equipment_key, 'Year')
             selected_years = st.multiselect("Filter by Year", years)
     with col2:
-        if 'Location' in st.session_state.equipment_data.columns:
-            locations = st.session_state.equipment_data['Location'].unique().tolist()
+        if 'Location' in equipment_data.columns:
+            locations = filter_options(equipment_data, st.session_state.equipment_key, 'Location')
             selected_locations = st.multiselect("Filter by Location", locations)
     with col3:
-        if 'Condition' in st.session_state.equipment_data.columns:
-            conditions = st.session_state.equipment_data['Condition'].unique().tolist()
+        if 'Condition' in equipment_data.columns:
+            conditions = filter_options(equipment_data, st.session_state.equipment_key, 'Condition')
             selected_conditions = st.multiselect("Filter by Condition", conditions)
     
-    # Apply filters
-    filtered_data = st.session_state.equipment_data.copy()
-    if 'Year' in filtered_data.columns and selected_years:
-        filtered_data = filtered_data[filtered_data['Year'].astype(str).isin(selected_years)]
-    if 'Location' in filtered_data.columns and selected_locations:
-        filtered_data = filtered_data[filtered_data['Location'].isin(selected_locations)]
-    if 'Condition' in filtered_data.columns and selected_conditions:
-        filtered_data = filtered_data[filtered_data['Condition'].isin(selected_conditions)]
-    
-    # Display data table with clickable rows
-    def highlight_row(df):
-        return [
-            'background-color: #e6f3ff' if i == st.session_state.selected_equipment else '' 
-            for i in range(len(df))
-        ]
+    # Apply filters as one combined mask so the frame is indexed only once
+    mask = pd.Series(True, index=equipment_data.index)
+    if selected_years:
+        mask &= equipment_data['Year'].isin(set(selected_years))
+    if selected_locations:
+        mask &= category_mask(equipment_data['Location'], selected_locations)
+    if selected_conditions:
+        mask &= category_mask(equipment_data['Condition'], selected_conditions)
+    filtered_data = equipment_data.loc[mask]
     
+    # Display data table with clickable rows. The table's own row selection
+    # marks the chosen row, so no Styler is needed.
     if not filtered_data.empty:
-        st.dataframe(filtered_data.style.apply(highlight_row, axis=0), use_container_width=True)
+        table = st.dataframe(filtered_data, use_container_width=True, on_select="rerun",
+                             selection_mode="single-row", key="equipment_table")
+        selected_rows = table.selection.rows
         
-        # Equipment selection
-        selected_unit = st.selectbox("Select equipment for detailed valuation", 
-                                     filtered_data['Unit #'].tolist())
+        # Equipment selection, a row clicked in the table becomes the default.
+        # Options are row positions, so the chosen row is fetched with iloc
+        # rather than by scanning for a matching unit.
+        # The table keeps its selection when filters change, so it can point
+        # past the end of the filtered rows.
+        unit_ids = filtered_data['Unit #'].to_numpy()
+        table_pos = selected_rows[0] if selected_rows else 0
+        selected_pos = st.selectbox("Select equipment for detailed valuation", 
+                                    range(len(unit_ids)),
+                                    index=table_pos if table_pos < len(unit_ids) else 0,
+                                    format_func=lambda pos: str(unit_ids[pos]))
+        selected_unit = unit_ids[selected_pos]
         
         if selected_unit:
-            st.session_state.selected_equipment = filtered_data[filtered_data['Unit #'] == selected_unit].index[0]
-            selected_row = filtered_data[filtered_data['Unit #'] == selected_unit].iloc[0]
+            selected_row = filtered_data.iloc[selected_pos]
+            selected_item = EquipmentItem.from_row(selected_row)
+            
+            # Prefer this session's results, then fall back to the engine's
+            # on-disk cache, which is shared by all sessions and survives
+            # restarts, so a valued item shows up without reprocessing
+            valuation = st.session_state.valuation_results.get(selected_unit)
+            if valuation is None:
+                valuation = get_cached_item_valuation(*selected_item)
             
             # Display detailed equipment info
             st.header(f"Equipment Details: {selected_unit}")
@@ -145,25 +281,23 @@ if st.session_state.equipment_data is not None:
                     st.text(f"{key}: {value}")
                 
                 # Check if we have valuation results
-                if st.session_state.valuation_results and selected_unit in st.session_state.valuation_results:
-                    valuation = st.session_state.valuation_results[selected_unit]
-                    
+                if valuation is not None:
                     # Generate PDF report
                     if st.button("Generate PDF Report"):
-                        pdf_path = generate_pdf_report(selected_row, valuation)
+                        pdf_bytes = render_pdf_bytes(selected_item, valuation)
                         
-                        # Create download link
-                        with open(pdf_path, "rb") as pdf_file:
-                            pdf_bytes = pdf_file.read()
-                            b64 = base64.b64encode(pdf_bytes).decode()
-                            href = f'<a href="data:application/pdf;base64,{b64}" download="{selected_unit}_valuation.pdf">Download PDF Report</a>'
-                            st.markdown(href, unsafe_allow_html=True)
+                        # Offer the file through a download button rather than
+                        # a base64 data URL embedded in the page
+                        st.download_button("Download PDF Report", data=pdf_bytes,
+                                           file_name=f"{selected_unit}_valuation.pdf",
+                                           mime="application/pdf")
             
             with col2:
-                # Display valuation results if available
-                if st.session_state.valuation_results and selected_unit in st.session_state.valuation_results:
-                    valuation = st.session_state.valuation_results[selected_unit]
-                    
+                # Display valuation results if available. The widgets are only
+                # built once the user asks for them.
+                if valuation is None:
+                    st.info("Click 'Process Valuations' in the sidebar to generate a valuation for this equipment")
+                elif st.toggle("Show valuation details"):
                     if isinstance(valuation, dict):
                         st.subheader("Valuation Results")
                         
@@ -176,11 +310,7 @@ if st.session_state.equipment_data is not None:
                             
                         if 'confidence' in valuation:
                             confidence = valuation['confidence']
-                            confidence_color = {
-                                'high': 'green',
-                                'medium': 'orange',
-                                'low': 'red'
-                            }.get(confidence.lower(), 'gray')
+                            confidence_color = CONFIDENCE_COLORS.get(confidence.lower(), 'gray')
                             st.markdown(f"Confidence: <span style='color:{confidence_color};font-weight:bold'>{confidence.upper()}</span>", unsafe_allow_html=True)
                         
                         if 'justification' in valuation:
@@ -189,13 +319,16 @@ if st.session_state.equipment_data is not None:
                                 
                         if 'comparable_sales' in valuation and valuation['comparable_sales']:
                             with st.expander("Comparable Sales"):
-                                for i, comp in enumerate(valuation['comparable_sales']):
-                                    st.markdown(f"**{i+1}. {comp['title']}**")
-                                    st.markdown(f"Price: ${comp['price']:,.2f}")
-                                    st.markdown(f"Date: {comp['date']}")
-                                    st.markdown(f"[Source]({comp['url']})")
-                                    if i < len(valuation['comparable_sales']) - 1:
-                                        st.markdown("---")
+                                # One table element rather than several markdown
+                                # elements per sale
+                                comps = pd.DataFrame(valuation['comparable_sales']).reindex(
+                                    columns=['title', 'price', 'date', 'url'])
+                                st.dataframe(comps, hide_index=True, use_container_width=True, column_config={
+                                    'title': st.column_config.TextColumn("Title"),
+                                    'price': st.column_config.NumberColumn("Price", format="dollar"),
+                                    'date': st.column_config.TextColumn("Date"),
+                                    'url': st.column_config.LinkColumn("Source"),
+                                })
                         
                         if 'key_factors' in valuation:
                             with st.expander("Key Factors Affecting Value"):
@@ -205,16 +338,17 @@ if st.session_state.equipment_data is not None:
                         # Raw response display
                         with st.expander("Raw Valuation Response"):
                             st.write(valuation)
-                else:
-                    st.info("Click 'Process Valuations' in the sidebar to generate a valuation for this equipment")
     else:
         st.info("No equipment matches the selected filters")
 else:
     st.info("Please upload an equipment list or use the sample data to begin")
 
+if valuation_run is not None:
+    run_valuation_batch(**valuation_run)
+
 # Footer
 st.markdown("---")
 col1, col2, col3 = st.columns([1, 2, 1])
 with col2:
     st.markdown("<div style='text-align: center'>© 2025 White Forrest Resources Inc.</div>", unsafe_allow_html=True)
-    st.markdown(f"<div style='text-align: center'>Generated on {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} UTC</div>", unsafe_allow_html=True)
\ No newline at end of file
+    st.markdown(f"<div style='text-align: center'>Session started {st.session_state.session_started} UTC</div>", unsafe_allow_html=True)
\ No newline at end of file
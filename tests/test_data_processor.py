@@ -0,0 +1,63 @@
+import openpyxl
+import pandas as pd
+
+from backend.data_processors.data_processor import load_data_chunks, validate_equipment_data
+
+def test_load_data_xlsx_matches_pandas(tmp_path):
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(['Unit #', 'Notes', 'Notes', 'Notes.1'])
+    sheet.append(['CAT-001', 'a', 'b', 'c'])
+    sheet.append([None, None, None, None])
+    sheet.append(['KUB-002', 'd', 'e', 'f'])
+    sheet.append([None, None, None, None])
+    path = tmp_path / 'equipment.xlsx'
+    workbook.save(path)
+    
+    chunks = list(load_data_chunks(str(path), chunksize=2))
+    
+    expected = pd.read_excel(path, engine='openpyxl')
+    assert list(expected.columns) == ['Unit #', 'Notes', 'Notes.2', 'Notes.1']
+    pd.testing.assert_frame_equal(pd.concat(chunks), expected, check_dtype=False)
+
+def test_validate_missing_description_without_cast_warning(recwarn):
+    df = pd.DataFrame({
+        'Unit #': ['CAT-001', 'KUB-002'],
+        'Description': [None, 'Mini'],
+        'Year': [2015, 2016],
+        'Condition': ['Good', 'Fair'],
+    })
+    
+    validated = validate_equipment_data(df)
+    
+    assert validated['validation_issues'].tolist() == [["Missing Description"], ["Description too short"]]
+    assert not [w for w in recwarn if issubclass(w.category, RuntimeWarning)]
+
+def test_validate_flags_year_too_large_for_int64():
+    df = pd.DataFrame({
+        'Unit #': ['CAT-001', 'KUB-002'],
+        'Description': ['Bulldozer D6', 'Mini excavator'],
+        'Year': [2015, 1e20],
+        'Condition': ['Good', 'Fair'],
+    })
+    
+    validated = validate_equipment_data(df)
+    
+    assert validated['Year'].dtype == 'Int64'
+    assert validated['Year'].iloc[0] == 2015
+    assert pd.isna(validated['Year'].iloc[1])
+    assert validated['validation_issues'].iloc[0] == []
+    assert validated['validation_issues'].iloc[1] == [f"Questionable year: {int(1e20)}"]
+
+def test_validate_flags_infinite_year():
+    df = pd.DataFrame({
+        'Unit #': ['CAT-001', 'KUB-002'],
+        'Description': ['Bulldozer D6', 'Mini excavator'],
+        'Year': [float('inf'), float('-inf')],
+        'Condition': ['Good', 'Fair'],
+    })
+    
+    validated = validate_equipment_data(df)
+    
+    assert validated['Year'].isna().all()
+    assert validated['validation_issues'].tolist() == [["Questionable year: inf"], ["Questionable year: -inf"]]